@@ -1,7 +1,12 @@
 import os
+import sqlite3
 from datetime import datetime, timedelta # Import timedelta for "Remember Me"
-from flask import Flask, render_template, request, redirect, url_for, flash, abort, send_from_directory
+from flask import Flask, render_template, request, redirect, url_for, flash, abort, send_from_directory, g
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import func, case, event, select, insert, bindparam, inspect, lambda_stmt
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import selectinload, contains_eager
 from werkzeug.security import generate_password_hash, check_password_hash
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 
@@ -11,12 +16,39 @@ app = Flask(__name__)
 app.config['SECRET_KEY'] = 'a-very-secret-and-hard-to-guess-key' 
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(basedir, 'instance', 'project.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# Keep warm SQLite connections around so requests don't reconnect and re-run the PRAGMAs below
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = {
+    'pool_size': 10,
+    'max_overflow': 20,
+    'pool_recycle': 1800,
+    'pool_pre_ping': True,
+    'connect_args': {'check_same_thread': False},
+}
 
 # ## IMPROVEMENT 1: Configure "Remember Me" cookie duration ##
 app.config['REMEMBER_COOKIE_DURATION'] = timedelta(days=365)
 
 db = SQLAlchemy(app)
 
+# WAL lets reads run alongside a write, and synchronous=NORMAL skips the fsync on every commit
+@event.listens_for(Engine, 'connect')
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    cursor.execute('PRAGMA journal_mode=WAL')
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA cache_size=-64000') # 64 MB page cache
+    cursor.close()
+    # pysqlite commits DDL immediately and only opens transactions before DML; turn that off and
+    # emit BEGIN ourselves (SQLAlchemy's documented workaround) so schema upgrades are atomic
+    dbapi_connection.isolation_level = None
+
+@event.listens_for(Engine, 'begin')
+def begin_sqlite_transaction(conn):
+    if conn.dialect.name == 'sqlite':
+        conn.exec_driver_sql('BEGIN')
+
 # --- FLASK-LOGIN SETUP ---
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -25,47 +57,161 @@ login_manager.login_message_category = 'info' # For better flash messages
 
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    return db.session.get(User, int(user_id))
+
+# --- DATABASE MODELS ---
 
-# --- DATABASE MODELS (No changes here) ---
+# scrypt is cheaper per login than werkzeug's pbkdf2 (600k rounds) at comparable strength.
+# check_password_hash reads the method from the stored hash, so older hashes still verify.
+PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
 
 class User(UserMixin, db.Model):
     id = db.Column(db.Integer, primary_key=True)
     username = db.Column(db.String(100), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False) # scrypt hashes are ~162 chars
     people = db.relationship('Person', backref='user', lazy=True, cascade="all, delete-orphan")
 
     def set_password(self, password):
-        self.password_hash = generate_password_hash(password)
+        self.password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
+
+    def needs_rehash(self):
+        return not self.password_hash.startswith(PASSWORD_HASH_METHOD + '$')
 
     def check_password(self, password):
         return check_password_hash(self.password_hash, password)
 
 class Person(db.Model):
+    # One name per user; the constraint's index leads with user_id, so it also serves lookups by owner
+    __table_args__ = (db.UniqueConstraint('user_id', 'name', name='uq_person_user_name'),)
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     debts = db.relationship('Debt', backref='person', lazy=True, cascade="all, delete-orphan")
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
 
 class Debt(db.Model):
+    # Covers add_transaction's open-debt lookup and the person join in index()
+    __table_args__ = (db.Index('ix_debt_person_dir_status', 'person_id', 'direction', 'status'),)
     id = db.Column(db.Integer, primary_key=True)
     direction = db.Column(db.String(10), nullable=False)
     status = db.Column(db.String(10), default='active', nullable=False)
     person_id = db.Column(db.Integer, db.ForeignKey('person.id'), nullable=False)
     transactions = db.relationship('Transaction', backref='debt', lazy=True, cascade="all, delete-orphan")
 
+    # Per-object fallback; request handlers should aggregate with signed_amount instead
     @property
     def balance(self):
         return sum(t.amount for t in self.transactions if t.type == 'loan') - sum(t.amount for t in self.transactions if t.type == 'payment')
 
 class Transaction(db.Model):
+    # Serves the per-debt aggregates and latest-date ordering without a table scan
+    __table_args__ = (db.Index('ix_tx_debt_date', 'debt_id', 'date'),)
     id = db.Column(db.Integer, primary_key=True)
-    amount = db.Column(db.Float, nullable=False)
+    amount = db.Column(db.Integer, nullable=False) # Stored in paise (1/100 rupee) so sums stay exact
     type = db.Column(db.String(10), nullable=False)
     description = db.Column(db.String(200), nullable=False)
     date = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     debt_id = db.Column(db.Integer, db.ForeignKey('debt.id'), nullable=False)
 
+# Largest amount a SQLite INTEGER column can hold
+MAX_PAISE = 2**63 - 1
+
+# Loans add to a debt's balance, payments subtract from it
+signed_amount = case((Transaction.type == 'loan', Transaction.amount), else_=-Transaction.amount)
+
+# --- SCHEMA UPGRADES ---
+# db.create_all() only builds missing tables, so changes to tables that already exist are
+# applied here, once per database, and tracked with SQLite's user_version.
+
+def store_amounts_as_paise(conn):
+    amount = next(c for c in inspect(conn).get_columns('transaction') if c['name'] == 'amount')
+    if isinstance(amount['type'], db.Integer):
+        # Already built with the paise column (e.g. by a plain db.create_all()); nothing to convert
+        return
+    # Rebuild the table so amount gets INTEGER affinity; a FLOAT column would keep storing reals
+    conn.exec_driver_sql('ALTER TABLE "transaction" RENAME TO transaction_old')
+    conn.exec_driver_sql("""CREATE TABLE "transaction" (
+        id INTEGER NOT NULL,
+        amount INTEGER NOT NULL,
+        type VARCHAR(10) NOT NULL,
+        description VARCHAR(200) NOT NULL,
+        date DATETIME NOT NULL,
+        debt_id INTEGER NOT NULL,
+        PRIMARY KEY (id),
+        FOREIGN KEY(debt_id) REFERENCES debt (id)
+    )""")
+    conn.exec_driver_sql(
+        'INSERT INTO "transaction" (id, amount, type, description, date, debt_id) '
+        'SELECT id, CAST(ROUND(amount * 100) AS INTEGER), type, description, date, debt_id FROM transaction_old'
+    )
+    conn.exec_driver_sql('DROP TABLE transaction_old')
+
+def add_lookup_indexes(conn):
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_debt_person_dir_status ON debt (person_id, direction, status)')
+    conn.exec_driver_sql('CREATE INDEX IF NOT EXISTS ix_tx_debt_date ON "transaction" (debt_id, date)')
+
+def add_unique_person_names(conn):
+    # The old check-then-insert in add_person could race, so duplicates may already exist.
+    # They own debts, so stop and name them rather than guess which row to keep.
+    duplicates = conn.exec_driver_sql(
+        'SELECT user_id, name, group_concat(id) FROM person GROUP BY user_id, name HAVING count(*) > 1'
+    ).all()
+    if duplicates:
+        details = '; '.join(f'user_id={user_id} name={name!r} person ids {ids}' for user_id, name, ids in duplicates)
+        raise RuntimeError(f'Cannot add uq_person_user_name: merge or rename these duplicate people first: {details}')
+    # add_person relies on this index to reject duplicate names instead of checking first
+    conn.exec_driver_sql('CREATE UNIQUE INDEX IF NOT EXISTS uq_person_user_name ON person (user_id, name)')
+
+# Append only: a database at user_version N has had the first N steps applied
+SCHEMA_UPGRADES = [
+    store_amounts_as_paise,
+    add_lookup_indexes,
+    add_unique_person_names,
+]
+
+def upgrade_db():
+    with db.engine.begin() as conn:
+        if not inspect(conn).has_table('transaction'):
+            # A new database gets the current schema directly and has nothing to upgrade
+            db.metadata.create_all(conn)
+            conn.exec_driver_sql(f'PRAGMA user_version = {len(SCHEMA_UPGRADES)}')
+            return
+        version = conn.exec_driver_sql('PRAGMA user_version').scalar()
+        for number, upgrade in enumerate(SCHEMA_UPGRADES[version:], start=version + 1):
+            upgrade(conn)
+            conn.exec_driver_sql(f'PRAGMA user_version = {number}')
+
+with app.app_context():
+    upgrade_db()
+
+# --- CACHED STATEMENTS ---
+# Built once at import; lambda_stmt skips rebuilding and re-keying the SQL on every request.
+
+balances_stmt = lambda_stmt(lambda: select(Debt.id, func.sum(signed_amount)).join(Transaction).join(Person).where(
+    Person.user_id == bindparam('uid'),
+    Debt.status == 'active'
+).group_by(Debt.id))
+
+totals_stmt = lambda_stmt(lambda: select(Debt.direction, func.sum(signed_amount)).join(Transaction).join(Person).where(
+    Person.user_id == bindparam('uid'),
+    Debt.status == 'active'
+).group_by(Debt.direction))
+
+own_person_stmt = lambda_stmt(lambda: select(Person).where(
+    Person.id == bindparam('person_id'),
+    Person.user_id == bindparam('uid')
+))
+
+open_debt_stmt = lambda_stmt(lambda: select(Debt).where(
+    Debt.person_id == bindparam('person_id'),
+    Debt.direction == bindparam('direction'),
+    Debt.status == 'active'
+))
+
+# One timestamp per request, passed explicitly to inserts instead of the column's callable default
+@app.before_request
+def set_request_time():
+    g.now = datetime.utcnow()
+
 # --- AUTHENTICATION ROUTES ---
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -81,6 +227,10 @@ def login():
         
         # ## IMPROVEMENT 1: Handle the "Remember Me" checkbox ##
         remember = request.form.get('remember') is not None
+        if user.needs_rehash():
+            # Move hashes made with an older method onto the current one
+            user.set_password(request.form.get('password'))
+            db.session.commit()
         login_user(user, remember=remember)
         return redirect(url_for('index'))
     return render_template('login.html')
@@ -123,26 +273,48 @@ def logout():
 @app.route('/')
 @login_required
 def index():
-    active_debts = Debt.query.join(Person).filter(
+    # Most recent transaction per debt, so the newest activity can be ordered first in SQL
+    latest = db.session.query(Transaction.debt_id, func.max(Transaction.date).label('last')).join(Debt).join(Person).filter(
         Person.user_id == current_user.id,
         Debt.status == 'active'
-    ).all()
+    ).group_by(Transaction.debt_id).subquery()
+    # The person comes from the join; every debt's history is batch-loaded in one IN query
+    active_debts = Debt.query.outerjoin(latest, latest.c.debt_id == Debt.id).join(Person).options(
+        contains_eager(Debt.person),
+        selectinload(Debt.transactions)
+    ).filter(
+        Person.user_id == current_user.id,
+        Debt.status == 'active'
+    ).order_by(latest.c.last.desc().nullslast()).all()
+    # One GROUP BY query for every balance instead of one lazy load per debt
+    balances = dict(db.session.execute(balances_stmt, {'uid': current_user.id}).all())
+    # Plain dicts for the template, so it never touches the ORM balance property
+    rows = [{
+        'id': d.id,
+        'direction': d.direction,
+        'person_name': d.person.name,
+        'balance': balances.get(d.id, 0),
+        'transactions': d.transactions,
+    } for d in active_debts]
     all_people = Person.query.filter_by(user_id=current_user.id).order_by(Person.name).all()
-    total_owed_to_me = sum(d.balance for d in active_debts if d.direction == 'lent')
-    total_i_owe = sum(d.balance for d in active_debts if d.direction == 'borrowed')
-    active_debts.sort(key=lambda d: max(t.date for t in d.transactions) if d.transactions else datetime.min, reverse=True)
-    return render_template('index.html', debts=active_debts, people=all_people, total_owed=total_owed_to_me, total_owe=total_i_owe)
+    # Both summary totals in one round-trip: one row per direction
+    totals = dict(db.session.execute(totals_stmt, {'uid': current_user.id}).all())
+    total_owed_to_me = totals.get('lent') or 0
+    total_i_owe = totals.get('borrowed') or 0
+    return render_template('index.html', debts=rows, people=all_people, total_owed=total_owed_to_me, total_owe=total_i_owe)
 
 @app.route('/add_person', methods=['POST'])
 @login_required
 def add_person():
     name = request.form.get('person_name', '').strip() # Use .strip() to remove whitespace
     if name:
-        existing = Person.query.filter_by(name=name, user_id=current_user.id).first()
-        if not existing:
+        # Let the unique constraint reject duplicates instead of checking with a SELECT first
+        try:
             db.session.add(Person(name=name, user_id=current_user.id))
             db.session.commit()
             flash(f'"{name}" has been added to your people.', 'success')
+        except IntegrityError:
+            db.session.rollback()
     else:
         flash('Person name cannot be empty.', 'warning')
     return redirect(url_for('index'))
@@ -159,40 +331,81 @@ def add_transaction():
         flash('All fields are required.', 'warning')
         return redirect(url_for('index'))
 
-    person = Person.query.filter_by(id=person_id, user_id=current_user.id).first()
-    if not person:
-        # This is a critical security check. If the person doesn't exist or doesn't belong to the user, abort.
-        abort(403) 
+    # This is a critical security check. The owner filter is part of the SELECT, so another user's person is simply not found.
+    person = db.session.execute(own_person_stmt, {'person_id': person_id, 'uid': current_user.id}).scalar()
+    if person is None:
+        abort(404)
     
     try:
-        amount = float(amount_str)
-        if amount <= 0:
+        amount = round(float(amount_str) * 100)
+        if amount <= 0 or amount > MAX_PAISE:
             raise ValueError
-    except (ValueError, TypeError):
+    except (ValueError, TypeError, OverflowError):
         flash('Invalid amount entered.', 'danger')
         return redirect(url_for('index'))
 
     direction = request.form.get('direction')
-    debt = Debt.query.filter_by(person_id=person.id, direction=direction, status='active').first()
+    debt = db.session.execute(open_debt_stmt, {'person_id': person.id, 'direction': direction}).scalar()
     if not debt:
         debt = Debt(person_id=person.id, direction=direction)
         db.session.add(debt)
-        db.session.commit()
+        db.session.flush() # Assigns debt.id; the single commit below writes both rows
 
-    db.session.add(Transaction(debt_id=debt.id, amount=amount, type='loan', description=description))
+    # Core INSERT: nothing reads the new row back, so skip building and tracking an ORM object
+    db.session.execute(insert(Transaction).values(debt_id=debt.id, amount=amount, type='loan', description=description, date=g.now))
     db.session.commit()
     flash('Transaction added successfully.', 'success')
     return redirect(url_for('index'))
 
-# ... (make_payment and settle_debt routes have no changes) ...
-@app.route('/make_payment/<int:debt_id>', methods=['POST']) #...
-@app.route('/settle/<int:debt_id>') #...
+def get_own_debt_or_404(debt_id):
+    # The ownership check is part of the query; the join also fills debt.person so it isn't loaded again
+    return Debt.query.join(Person).options(contains_eager(Debt.person)).filter(
+        Debt.id == debt_id,
+        Person.user_id == current_user.id
+    ).first_or_404()
+
+@app.route('/make_payment/<int:debt_id>', methods=['POST'])
+@login_required
+def make_payment(debt_id):
+    debt = get_own_debt_or_404(debt_id)
+
+    try:
+        payment_amount = round(float(request.form.get('payment_amount')) * 100)
+        if payment_amount <= 0 or payment_amount > MAX_PAISE:
+            raise ValueError
+    except (ValueError, TypeError, OverflowError):
+        flash('Invalid payment amount.', 'danger')
+        return redirect(url_for('index'))
+
+    # Read the balance once, summed in SQL, and reuse it for every check below
+    bal = db.session.query(func.coalesce(func.sum(signed_amount), 0)).filter(Transaction.debt_id == debt.id).scalar()
+    # Never record more than is still owed
+    payment_amount = min(payment_amount, bal)
+    if bal > 0:
+        db.session.execute(insert(Transaction).values(debt_id=debt.id, amount=payment_amount, type='payment', description='Payment', date=g.now))
+        if bal - payment_amount <= 0:
+            debt.status = 'settled'
+        # The payment and any status change are written in one commit
+        db.session.commit()
+        flash('Payment recorded.', 'success')
+    return redirect(url_for('index'))
+
+@app.route('/settle/<int:debt_id>')
+@login_required
+def settle_debt(debt_id):
+    debt = get_own_debt_or_404(debt_id)
+    debt.status = 'settled'
+    db.session.commit()
+    flash(f'Debt with {debt.person.name} has been settled.', 'success')
+    return redirect(url_for('index'))
 
 # ## IMPROVEMENT 2: Routes to serve the PWA files ##
 @app.route('/manifest.json')
 def serve_manifest():
-    return send_from_directory(app.root_path, 'manifest.json')
+    # The manifest rarely changes, so let browsers keep it for a day
+    return send_from_directory(app.root_path, 'manifest.json', max_age=86400, conditional=True)
 
 @app.route('/service-worker.js')
 def serve_sw():
-    return send_from_directory(app.root_path, 'service-worker.js', mimetype='application/javascript')
\ No newline at end of file
+    # No max-age so updates are picked up right away; the ETag still lets unchanged checks return 304
+    return send_from_directory(app.root_path, 'service-worker.js', mimetype='application/javascript', max_age=0, conditional=True)
\ No newline at end of file